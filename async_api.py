@@ -0,0 +1,46 @@
+# async_api.py - Concurrent Polymarket fetches for the copy trading scan
+
+import asyncio
+import logging
+from typing import Dict, List
+
+import aiohttp
+
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+# Same policy as the requests session: Retry(total=3, backoff_factor=0.3)
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.3
+
+
+async def _get_json(session: aiohttp.ClientSession, url: str, params: Dict = None):
+    """GET a URL and decode the JSON body, retrying transient connection errors"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with session.get(url, params=params) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == MAX_RETRIES:
+                raise
+            await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
+
+
+async def fetch_trader_positions(session: aiohttp.ClientSession, gamma_url: str,
+                                 address: str) -> List[Dict]:
+    """Get one trader's positions"""
+    try:
+        data = await _get_json(session, f"{gamma_url}/positions", {'user': address})
+        return data if isinstance(data, list) else []
+    except Exception as e:
+        logging.error(f"Error fetching trader positions for {address}: {e}")
+        return []
+
+
+async def fetch_all_trader_positions(session: aiohttp.ClientSession, gamma_url: str,
+                                     addresses: List[str]) -> Dict[str, List[Dict]]:
+    """Get positions for every trader concurrently, keyed by address"""
+    results = await asyncio.gather(
+        *(fetch_trader_positions(session, gamma_url, address) for address in addresses)
+    )
+    return dict(zip(addresses, results))
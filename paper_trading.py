@@ -1,6 +1,10 @@
 # week1_paper_trading.py
 
+import asyncio
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import sqlite3
 from datetime import datetime
@@ -9,6 +13,11 @@ import time
 import logging
 import signal
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import async_api
 
 # Set up logging
 logging.basicConfig(
@@ -20,22 +29,178 @@ logging.basicConfig(
     ]
 )
 
+# Retries for BEGIN IMMEDIATE when another process (e.g. quick_check.py) holds
+# the write lock past sqlite3's own busy timeout
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.1  # seconds, doubled after each attempt
+
+# SQL used on every scan or trade. Kept at module scope so each statement is a
+# single constant string that sqlite3 prepares once per connection and then
+# serves from its statement cache.
+SQL_SELECT_BALANCE = "SELECT balance FROM account WHERE id = 1"
+
+SQL_SELECT_ACCOUNT = "SELECT balance, initial_balance FROM account WHERE id = 1"
+
+SQL_INSERT_ACCOUNT = """
+    INSERT INTO account (id, balance, initial_balance, created_at, updated_at)
+    VALUES (1, ?, ?, ?, ?)
+"""
+
+SQL_UPDATE_BALANCE = """
+    UPDATE account
+    SET balance = ?, updated_at = ?
+    WHERE id = 1
+"""
+
+SQL_INSERT_POSITION = """
+    INSERT INTO positions (market_id, token_id, market_question, outcome,
+                           side, size, entry_price, current_price,
+                           unrealized_pnl, opened_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_SELECT_OPEN_POSITION = """
+    SELECT id, size, entry_price FROM positions
+    WHERE market_id = ? AND outcome = ? AND status = 'OPEN'
+"""
+
+SQL_CLOSE_POSITION = """
+    UPDATE positions
+    SET status = 'CLOSED', closed_at = ?
+    WHERE id = ?
+"""
+
+SQL_REDUCE_POSITION = """
+    UPDATE positions
+    SET size = size - ?
+    WHERE id = ?
+"""
+
+SQL_SELECT_OPEN_POSITIONS_FOR_PRICING = """
+    SELECT id, market_id, outcome, size, entry_price
+    FROM positions
+    WHERE status = 'OPEN'
+"""
+
+SQL_UPDATE_POSITION_PRICE = """
+    UPDATE positions
+    SET current_price = ?, unrealized_pnl = ?
+    WHERE id = ?
+"""
+
+SQL_SELECT_OPEN_POSITIONS = """
+    SELECT id, market_id, market_question, outcome, size, entry_price,
+           current_price, unrealized_pnl, opened_at
+    FROM positions
+    WHERE status = 'OPEN'
+"""
+
+SQL_OPEN_POSITION_TOTALS = """
+    SELECT COUNT(*),
+           COALESCE(SUM(unrealized_pnl), 0),
+           COALESCE(SUM(size * current_price), 0)
+    FROM positions
+    WHERE status = 'OPEN'
+"""
+
+SQL_INSERT_TRADE = """
+    INSERT INTO trades (market_id, token_id, market_question, outcome,
+                        side, size, price, cost, realized_pnl, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_TRADE_TOTALS = """
+    SELECT COUNT(*),
+           COALESCE(SUM(CASE WHEN side = 'SELL' THEN realized_pnl END), 0)
+    FROM trades
+"""
+
+SQL_INSERT_TRACKED_TRADER = """
+    INSERT OR IGNORE INTO tracked_traders (address, nickname, added_at)
+    VALUES (?, ?, ?)
+"""
+
+SQL_SELECT_TRACKED_TRADERS = """
+    SELECT address, nickname, added_at, total_copied_trades
+    FROM tracked_traders
+"""
+
+SQL_INCREMENT_COPIED_TRADES = """
+    UPDATE tracked_traders
+    SET total_copied_trades = total_copied_trades + 1
+    WHERE address = ?
+"""
+
+# executemany stops at the first error, so duplicates are skipped in SQL
+SQL_INSERT_SNAPSHOT = """
+    INSERT INTO trader_positions_snapshot
+    (trader_address, market_id, outcome, size, snapshot_time)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(trader_address, market_id, outcome, snapshot_time) DO NOTHING
+"""
+
+SQL_SELECT_LAST_SNAPSHOT_TIME = """
+    SELECT MAX(snapshot_time)
+    FROM trader_positions_snapshot
+    WHERE trader_address = ?
+"""
+
+# UNIQUE(trader_address, market_id, outcome, snapshot_time) makes DISTINCT redundant
+SQL_SELECT_SNAPSHOT_POSITIONS = """
+    SELECT market_id, outcome
+    FROM trader_positions_snapshot
+    WHERE trader_address = ? AND snapshot_time = ?
+"""
+
+
 class PolymarketPaperTrading:
     """Paper trading with real Polymarket data"""
     
-    def __init__(self, db_path: str = "week1_paper.db", initial_balance: float = 100000):
+    def __init__(self, db_path: str = "week1_paper.db", initial_balance: float = 100000,
+                 market_cache_ttl: float = 30):
         self.base_url = "https://clob.polymarket.com"
         self.gamma_url = "https://gamma-api.polymarket.com"
         self.db_path = db_path
         self.initial_balance = initial_balance
         
+        # condition_id -> (fetched_at, market). Quotes are reused for up to
+        # market_cache_ttl seconds, so paper fills may be priced that stale.
+        self.market_cache_ttl = market_cache_ttl
+        self._market_cache: Dict[str, tuple] = {}
+        self._next_cache_sweep = 0.0
+        
+        # Last known account balance, kept in step with execute_paper_trade
+        self._balance_cache: Optional[float] = None
+        
+        # Pooled keep-alive session so repeated API calls skip the TLS handshake
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.3)
+        )
+        self.session.mount(self.base_url, adapter)
+        self.session.mount(self.gamma_url, adapter)
+        
+        # One shared connection; autocommit mode, transactions are explicit
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        
         self._init_database()
         self._init_account()
         
     def _init_database(self):
         """Create database to track paper trades"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
+        
+        # WAL lets quick_check.py read while the bot is writing
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.execute("PRAGMA cache_size=-65536")
         
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS account (
@@ -102,26 +267,78 @@ class PolymarketPaperTrading:
             )
         """)
         
-        conn.commit()
-        conn.close()
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_positions_open
+            ON positions(status, market_id, outcome)
+        """)
         
-    def _init_account(self):
-        """Initialize paper trading account"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Trade totals scan the whole table, so an index on side only slows inserts
+        cursor.execute("DROP INDEX IF EXISTS idx_trades_side")
         
-        cursor.execute("SELECT * FROM account WHERE id = 1")
-        if not cursor.fetchone():
-            cursor.execute("""
-                INSERT INTO account (id, balance, initial_balance, created_at, updated_at)
-                VALUES (1, ?, ?, ?, ?)
-            """, (self.initial_balance, self.initial_balance, 
-                  datetime.now().isoformat(), datetime.now().isoformat()))
-            conn.commit()
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_snapshot_addr_time
+            ON trader_positions_snapshot(trader_address, snapshot_time DESC)
+        """)
         
-        conn.close()
+    def _init_account(self):
+        """Initialize paper trading account"""
+        now_iso = datetime.now().isoformat()
+        
+        with self._transaction() as cursor:
+            cursor.execute(SQL_SELECT_BALANCE)
+            account = cursor.fetchone()
+            if not account:
+                cursor.execute(SQL_INSERT_ACCOUNT, (self.initial_balance, self.initial_balance,
+                                                    now_iso, now_iso))
+                self._balance_cache = self.initial_balance
+            else:
+                self._balance_cache = account['balance']
     
-
+    @contextmanager
+    def _transaction(self):
+        """Run a block of statements as one write transaction on the shared connection
+        
+        BEGIN IMMEDIATE takes the write lock up front, so a read-modify-write
+        such as the balance update cannot be invalidated by another writer.
+        The block may issue its own ROLLBACK to abandon the transaction.
+        """
+        with self._lock:
+            cursor = self.conn.cursor()
+            self._begin_immediate(cursor)
+            try:
+                yield cursor
+                if self.conn.in_transaction:
+                    cursor.execute("COMMIT")
+            except Exception:
+                if self.conn.in_transaction:
+                    cursor.execute("ROLLBACK")
+                # The block may have updated the cached balance; reload it lazily
+                self._balance_cache = None
+                raise
+    
+    @staticmethod
+    def _begin_immediate(cursor: sqlite3.Cursor):
+        """BEGIN IMMEDIATE, backing off while the database is locked"""
+        for attempt in range(BUSY_RETRIES):
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == BUSY_RETRIES - 1:
+                    raise
+                logging.warning(f"⚠️  Database busy, retrying ({attempt + 1}/{BUSY_RETRIES})")
+                time.sleep(BUSY_BACKOFF * (2 ** attempt))
+    
+    def optimize_database(self):
+        """Let SQLite refresh query planner statistics"""
+        with self._lock:
+            self.conn.execute("PRAGMA optimize")
+    
+    def close(self):
+        """Close the database connection and HTTP session"""
+        self.session.close()
+        with self._lock:
+            self.conn.close()
     
     def get_live_markets(self, limit: int = 50, closed: bool = False) -> List[Dict]:
         """Get real active markets from Polymarket"""
@@ -131,7 +348,7 @@ class PolymarketPaperTrading:
                 'closed': closed,
                 'active': not closed
             }
-            response = requests.get(f"{self.gamma_url}/markets", params=params, timeout=10)
+            response = self.session.get(f"{self.gamma_url}/markets", params=params, timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -139,29 +356,83 @@ class PolymarketPaperTrading:
             return []
     
     def get_live_market_details(self, condition_id: str) -> Optional[Dict]:
-        """Get real market details"""
+        """Get real market details, served from cache while fresh"""
+        market = self._get_cached_market(condition_id)
+        if market is not None:
+            return market
+        
         try:
-            response = requests.get(f"{self.gamma_url}/markets/{condition_id}", timeout=10)
+            response = self.session.get(f"{self.gamma_url}/markets/{condition_id}", timeout=10)
             response.raise_for_status()
-            return response.json()
+            market = response.json()
         except Exception as e:
             logging.error(f"Error fetching market {condition_id}: {e}")
             return None
+        
+        self.cache_market_details(condition_id, market)
+        return market
+    
+    def _get_cached_market(self, condition_id: str) -> Optional[Dict]:
+        """Return a cached market if it is younger than the TTL"""
+        entry = self._market_cache.get(condition_id)
+        if entry is None:
+            return None
+        
+        fetched_at, market = entry
+        if time.monotonic() - fetched_at >= self.market_cache_ttl:
+            self._market_cache.pop(condition_id, None)
+            return None
+        return market
     
-    def get_live_trader_positions(self, address: str) -> List[Dict]:
-        """Get real trader positions"""
+    def cache_market_details(self, condition_id: str, market: Optional[Dict]):
+        """Remember market details fetched elsewhere (e.g. by the async scan)"""
+        if not market:
+            return
+        
+        now = time.monotonic()
+        # Sweep expired entries at most once per TTL so markets we never look
+        # up again don't pile up, without rescanning the cache on every insert
+        if now >= self._next_cache_sweep:
+            self._next_cache_sweep = now + self.market_cache_ttl
+            expired = [cid for cid, (fetched_at, _) in list(self._market_cache.items())
+                       if now - fetched_at >= self.market_cache_ttl]
+            for cid in expired:
+                self._market_cache.pop(cid, None)
+        
+        self._market_cache[condition_id] = (now, market)
+    
+    def get_live_markets_by_ids(self, condition_ids: List[str]) -> Dict[str, Dict]:
+        """Get several markets in one request, keyed by condition id"""
+        markets = {}
+        ids = []
+        for cid in dict.fromkeys(cid for cid in condition_ids if cid):
+            cached = self._get_cached_market(cid)
+            if cached is not None:
+                markets[cid] = cached
+            else:
+                ids.append(cid)
+        
+        if not ids:
+            return markets
+        
         try:
-            response = requests.get(
-                f"{self.gamma_url}/positions",
-                params={'user': address},
+            response = self.session.get(
+                f"{self.gamma_url}/markets",
+                params={'condition_ids': ids, 'limit': len(ids)},
                 timeout=10
             )
             response.raise_for_status()
             data = response.json()
-            return data if isinstance(data, list) else []
         except Exception as e:
-            logging.error(f"Error fetching trader positions for {address}: {e}")
-            return []
+            logging.error(f"Error fetching {len(ids)} markets: {e}")
+            return markets
+        
+        for market in data if isinstance(data, list) else []:
+            condition_id = market.get('conditionId') or market.get('condition_id')
+            if condition_id:
+                markets[condition_id] = market
+                self.cache_market_details(condition_id, market)
+        return markets
     
     def get_current_market_price(self, market_id: str, outcome: str = "YES") -> Optional[float]:
         """Get current market price for an outcome"""
@@ -169,26 +440,38 @@ class PolymarketPaperTrading:
         if not market:
             return None
         
+        return self._price_for_outcome(market, outcome)
+    
+    @staticmethod
+    def _price_for_outcome(market: Dict, outcome: str) -> float:
+        """Pick the YES or NO price out of a market payload"""
         if outcome == "YES":
             return market.get('yes_price', 0.5)
         else:
             return market.get('no_price', 0.5)
     
-   
-    
     def get_account_balance(self) -> float:
         """Get current paper account balance"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT balance FROM account WHERE id = 1")
-        balance = cursor.fetchone()[0]
-        conn.close()
+        balance = self._balance_cache
+        if balance is not None:
+            return balance
+        
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(SQL_SELECT_BALANCE)
+            balance = cursor.fetchone()[0]
+            self._balance_cache = balance
         return balance
     
     def execute_paper_trade(self, market_id: str, market_question: str,
                            outcome: str, side: str, size: float,
-                           token_id: str = None) -> Dict:
-        """Execute a paper trade based on real market prices"""
+                           token_id: str = None,
+                           copied_from_trader: str = None) -> Dict:
+        """Execute a paper trade based on real market prices
+        
+        If copied_from_trader is given, that tracked trader's copy counter is
+        bumped in the same transaction as the trade.
+        """
         
         price = self.get_current_market_price(market_id, outcome)
         
@@ -198,99 +481,73 @@ class PolymarketPaperTrading:
                 'error': 'Could not fetch current market price'
             }
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT balance FROM account WHERE id = 1")
-        balance = cursor.fetchone()[0]
+        # One timestamp for every row this trade touches
+        now_iso = datetime.now().isoformat()
         
-        if side == 'BUY':
-            cost = size * price
-            
-            if cost > balance:
-                conn.close()
-                return {
-                    'success': False,
-                    'error': f'Insufficient balance. Need ${cost:.2f}, have ${balance:.2f}'
-                }
-            
-            new_balance = balance - cost
-            
-            cursor.execute("""
-                INSERT INTO positions (market_id, token_id, market_question, outcome, 
-                                     side, size, entry_price, current_price, 
-                                     unrealized_pnl, opened_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (market_id, token_id, market_question, outcome, side, size, 
-                  price, price, 0.0, datetime.now().isoformat()))
-            
-            cursor.execute("""
-                INSERT INTO trades (market_id, token_id, market_question, outcome, 
-                                  side, size, price, cost, realized_pnl, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (market_id, token_id, market_question, outcome, side, size, 
-                  price, cost, 0.0, datetime.now().isoformat()))
-            
-            realized_pnl = 0
-            
-        else:  # SELL
-            cursor.execute("""
-                SELECT id, size, entry_price FROM positions
-                WHERE market_id = ? AND outcome = ? AND status = 'OPEN'
-            """, (market_id, outcome))
-            
-            position = cursor.fetchone()
-            
-            if not position:
-                conn.close()
-                return {
-                    'success': False,
-                    'error': 'No open position to sell'
-                }
-            
-            pos_id, pos_size, entry_price = position
-            
-            if size > pos_size:
-                conn.close()
-                return {
-                    'success': False,
-                    'error': f'Cannot sell {size} shares, only have {pos_size}'
-                }
+        with self._transaction() as cursor:
+            cursor.execute(SQL_SELECT_BALANCE)
+            balance = cursor.fetchone()[0]
             
-            realized_pnl = (price - entry_price) * size
-            proceeds = size * price
-            new_balance = balance + proceeds
-            
-            if size == pos_size:
-                cursor.execute("""
-                    UPDATE positions
-                    SET status = 'CLOSED', closed_at = ?
-                    WHERE id = ?
-                """, (datetime.now().isoformat(), pos_id))
-            else:
-                cursor.execute("""
-                    UPDATE positions
-                    SET size = size - ?
-                    WHERE id = ?
-                """, (size, pos_id))
+            if side == 'BUY':
+                cost = size * price
+                
+                if cost > balance:
+                    cursor.execute("ROLLBACK")
+                    return {
+                        'success': False,
+                        'error': f'Insufficient balance. Need ${cost:.2f}, have ${balance:.2f}'
+                    }
+                
+                new_balance = balance - cost
+                
+                cursor.execute(SQL_INSERT_POSITION, (market_id, token_id, market_question, outcome,
+                                                     side, size, price, price, 0.0, now_iso))
+                
+                cursor.execute(SQL_INSERT_TRADE, (market_id, token_id, market_question, outcome,
+                                                  side, size, price, cost, 0.0, now_iso))
+                
+                realized_pnl = 0
+                
+            else:  # SELL
+                cursor.execute(SQL_SELECT_OPEN_POSITION, (market_id, outcome))
+                
+                position = cursor.fetchone()
+                
+                if not position:
+                    cursor.execute("ROLLBACK")
+                    return {
+                        'success': False,
+                        'error': 'No open position to sell'
+                    }
+                
+                pos_id, pos_size, entry_price = position
+                
+                if size > pos_size:
+                    cursor.execute("ROLLBACK")
+                    return {
+                        'success': False,
+                        'error': f'Cannot sell {size} shares, only have {pos_size}'
+                    }
+                
+                realized_pnl = (price - entry_price) * size
+                proceeds = size * price
+                new_balance = balance + proceeds
+                
+                if size == pos_size:
+                    cursor.execute(SQL_CLOSE_POSITION, (now_iso, pos_id))
+                else:
+                    cursor.execute(SQL_REDUCE_POSITION, (size, pos_id))
+                
+                cursor.execute(SQL_INSERT_TRADE, (market_id, token_id, market_question, outcome,
+                                                  side, size, price, -proceeds, realized_pnl, now_iso))
+                
+                cost = proceeds
             
-            cursor.execute("""
-                INSERT INTO trades (market_id, token_id, market_question, outcome,
-                                  side, size, price, cost, realized_pnl, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (market_id, token_id, market_question, outcome, side, size,
-                  price, -proceeds, realized_pnl, datetime.now().isoformat()))
+            cursor.execute(SQL_UPDATE_BALANCE, (new_balance, now_iso))
+            self._balance_cache = new_balance
             
-            cost = proceeds
-        
-        cursor.execute("""
-            UPDATE account
-            SET balance = ?, updated_at = ?
-            WHERE id = 1
-        """, (new_balance, datetime.now().isoformat()))
-        
-        conn.commit()
-        conn.close()
+            if copied_from_trader:
+                cursor.execute(SQL_INCREMENT_COPIED_TRADES, (copied_from_trader,))
         
         return {
             'success': True,
@@ -306,63 +563,70 @@ class PolymarketPaperTrading:
     
     def update_positions_with_live_prices(self):
         """Update all open positions with current market prices"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(SQL_SELECT_OPEN_POSITIONS_FOR_PRICING)
+            positions = cursor.fetchall()
+        
+        # Nothing to price (e.g. a fresh account) - skip the API and the write
+        if not positions:
+            return
         
-        cursor.execute("SELECT * FROM positions WHERE status = 'OPEN'")
-        positions = cursor.fetchall()
+        # Fetch prices outside the lock so other callers aren't blocked on HTTP.
+        # One bulk request covers every open market; stragglers fall back to
+        # a per-market lookup.
+        markets = self.get_live_markets_by_ids([pos['market_id'] for pos in positions])
         
+        updates = []
         for pos in positions:
-            pos_id = pos[0]
-            market_id = pos[1]
-            outcome = pos[4]
-            size = pos[6]
-            entry_price = pos[7]
+            pos_id = pos['id']
+            market_id = pos['market_id']
+            outcome = pos['outcome']
+            size = pos['size']
+            entry_price = pos['entry_price']
             
-            current_price = self.get_current_market_price(market_id, outcome)
+            market = markets.get(market_id)
+            if market:
+                current_price = self._price_for_outcome(market, outcome)
+            else:
+                current_price = self.get_current_market_price(market_id, outcome)
             
             if current_price:
                 unrealized_pnl = (current_price - entry_price) * size
-                
-                cursor.execute("""
-                    UPDATE positions
-                    SET current_price = ?, unrealized_pnl = ?
-                    WHERE id = ?
-                """, (current_price, unrealized_pnl, pos_id))
+                updates.append((current_price, unrealized_pnl, pos_id))
         
-        conn.commit()
-        conn.close()
-    
-    def get_portfolio_summary(self) -> Dict:
-        """Get complete portfolio summary with live prices"""
-        self.update_positions_with_live_prices()
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if not updates:
+            return
         
-        cursor.execute("SELECT * FROM account WHERE id = 1")
-        account = cursor.fetchone()
-        balance = account[1]
-        initial_balance = account[2]
-        
-        cursor.execute("SELECT * FROM positions WHERE status = 'OPEN'")
-        positions = cursor.fetchall()
+        with self._transaction() as cursor:
+            cursor.executemany(SQL_UPDATE_POSITION_PRICE, updates)
+    
+    def get_portfolio_summary(self, refresh: bool = True) -> Dict:
+        """Get complete portfolio summary with live prices
         
-        total_unrealized_pnl = sum(pos[9] for pos in positions)
-        total_position_value = sum(pos[6] * pos[8] for pos in positions)
+        Pass refresh=False if update_positions_with_live_prices() was just called.
+        """
+        if refresh:
+            self.update_positions_with_live_prices()
         
-        cursor.execute("SELECT SUM(realized_pnl) FROM trades WHERE side = 'SELL'")
-        total_realized_pnl = cursor.fetchone()[0] or 0
+        with self._lock:
+            cursor = self.conn.cursor()
+            
+            cursor.execute(SQL_SELECT_ACCOUNT)
+            account = cursor.fetchone()
+            balance = account['balance']
+            initial_balance = account['initial_balance']
+            
+            cursor.execute(SQL_OPEN_POSITION_TOTALS)
+            open_positions, total_unrealized_pnl, total_position_value = cursor.fetchone()
+            
+            cursor.execute(SQL_TRADE_TOTALS)
+            total_trades, total_realized_pnl = cursor.fetchone()
         
         portfolio_value = balance + total_position_value
         total_pnl = portfolio_value - initial_balance
         total_return_pct = (total_pnl / initial_balance) * 100
         
-        cursor.execute("SELECT COUNT(*) FROM trades")
-        total_trades = cursor.fetchone()[0]
-        
-        conn.close()
-        
         return {
             'initial_balance': initial_balance,
             'cash_balance': balance,
@@ -372,34 +636,37 @@ class PolymarketPaperTrading:
             'total_return_pct': total_return_pct,
             'unrealized_pnl': total_unrealized_pnl,
             'realized_pnl': total_realized_pnl,
-            'open_positions': len(positions),
+            'open_positions': open_positions,
             'total_trades': total_trades
         }
     
-    def get_open_positions(self) -> List[Dict]:
-        """Get all open positions with current prices"""
-        self.update_positions_with_live_prices()
+    def get_open_positions(self, refresh: bool = True) -> List[Dict]:
+        """Get all open positions with current prices
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        Pass refresh=False if update_positions_with_live_prices() was just called.
+        """
+        if refresh:
+            self.update_positions_with_live_prices()
         
-        cursor.execute("SELECT * FROM positions WHERE status = 'OPEN'")
-        rows = cursor.fetchall()
-        conn.close()
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(SQL_SELECT_OPEN_POSITIONS)
+            rows = cursor.fetchall()
         
         positions = []
         for row in rows:
+            cost_basis = row['size'] * row['entry_price']
             positions.append({
-                'id': row[0],
-                'market_id': row[1],
-                'question': row[3],
-                'outcome': row[4],
-                'size': row[6],
-                'entry_price': row[7],
-                'current_price': row[8],
-                'unrealized_pnl': row[9],
-                'unrealized_pnl_pct': (row[9] / (row[6] * row[7])) * 100 if row[6] * row[7] > 0 else 0,
-                'opened_at': row[11]
+                'id': row['id'],
+                'market_id': row['market_id'],
+                'question': row['market_question'],
+                'outcome': row['outcome'],
+                'size': row['size'],
+                'entry_price': row['entry_price'],
+                'current_price': row['current_price'],
+                'unrealized_pnl': row['unrealized_pnl'],
+                'unrealized_pnl_pct': (row['unrealized_pnl'] / cost_basis) * 100 if cost_basis > 0 else 0,
+                'opened_at': row['opened_at']
             })
         
         return positions
@@ -408,91 +675,68 @@ class PolymarketPaperTrading:
     
     def add_trader_to_track(self, address: str, nickname: str = None):
         """Add a trader to copy"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        now_iso = datetime.now().isoformat()
         
-        try:
-            cursor.execute("""
-                INSERT INTO tracked_traders (address, nickname, added_at)
-                VALUES (?, ?, ?)
-            """, (address, nickname or address[:10], datetime.now().isoformat()))
-            conn.commit()
+        with self._transaction() as cursor:
+            cursor.execute(SQL_INSERT_TRACKED_TRADER, (address, nickname or address[:10], now_iso))
+            inserted = cursor.rowcount > 0
+        
+        if inserted:
             logging.info(f"✅ Now tracking trader: {nickname or address}")
-        except sqlite3.IntegrityError:
+        else:
             logging.warning(f"⚠️  Already tracking {address}")
-        
-        conn.close()
     
     def get_tracked_traders(self) -> List[Dict]:
         """Get all tracked traders"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM tracked_traders")
-        rows = cursor.fetchall()
-        conn.close()
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(SQL_SELECT_TRACKED_TRADERS)
+            rows = cursor.fetchall()
         
         return [
             {
-                'address': row[0],
-                'nickname': row[1],
-                'added_at': row[2],
-                'total_copied': row[3]
+                'address': row['address'],
+                'nickname': row['nickname'],
+                'added_at': row['added_at'],
+                'total_copied': row['total_copied_trades']
             }
             for row in rows
         ]
     
     def save_trader_snapshot(self, address: str, positions: List[Dict]):
         """Save snapshot of trader's positions"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         snapshot_time = datetime.now().isoformat()
         
-        for pos in positions:
-            try:
-                cursor.execute("""
-                    INSERT INTO trader_positions_snapshot 
-                    (trader_address, market_id, outcome, size, snapshot_time)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (address, pos.get('market'), pos.get('outcome'), 
-                      pos.get('size'), snapshot_time))
-            except sqlite3.IntegrityError:
-                pass
-        
-        conn.commit()
-        conn.close()
+        rows = [
+            (address, pos.get('market'), pos.get('outcome'), 
+             pos.get('size'), snapshot_time)
+            for pos in positions
+        ]
+        
+        with self._transaction() as cursor:
+            cursor.executemany(SQL_INSERT_SNAPSHOT, rows)
     
     def detect_new_positions(self, address: str, current_positions: List[Dict]) -> List[Dict]:
         """Compare current positions with last snapshot to find new ones"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT DISTINCT market_id, outcome, size 
-            FROM trader_positions_snapshot
-            WHERE trader_address = ?
-            AND snapshot_time = (
-                SELECT MAX(snapshot_time) 
-                FROM trader_positions_snapshot 
-                WHERE trader_address = ?
-            )
-        """, (address, address))
-        
-        last_positions = cursor.fetchall()
-        conn.close()
-        
-        last_pos_set = {(p[0], p[1]) for p in last_positions}
-        
-        new_positions = []
-        for pos in current_positions:
-            market_id = pos.get('market')
-            outcome = pos.get('outcome')
+        with self._lock:
+            cursor = self.conn.cursor()
+            
+            # Two index probes instead of a correlated subquery
+            cursor.execute(SQL_SELECT_LAST_SNAPSHOT_TIME, (address,))
+            last_snapshot_time = cursor.fetchone()[0]
             
-            if (market_id, outcome) not in last_pos_set:
-                new_positions.append(pos)
+            if last_snapshot_time is None:
+                last_positions = []
+            else:
+                cursor.execute(SQL_SELECT_SNAPSHOT_POSITIONS, (address, last_snapshot_time))
+                last_positions = cursor.fetchall()
+        
+        last_pos_set = frozenset((p['market_id'], p['outcome']) for p in last_positions)
         
-        return new_positions
+        return [
+            pos for pos in current_positions
+            if (pos.get('market'), pos.get('outcome')) not in last_pos_set
+        ]
 
 
 class CopyTradingBot:
@@ -504,21 +748,29 @@ class CopyTradingBot:
         
     def monitor_and_copy_trades(self):
         """Check tracked traders and copy new positions"""
+        return asyncio.run(self.monitor_and_copy_trades_async())
+    
+    async def monitor_and_copy_trades_async(self):
+        """Fetch all traders concurrently, then copy new positions"""
         tracked = self.trader.get_tracked_traders()
         
         if not tracked:
             logging.warning("⚠️  No traders being tracked.")
             return []
         
-        results = []
+        async with aiohttp.ClientSession(timeout=async_api.REQUEST_TIMEOUT) as session:
+            all_positions = await async_api.fetch_all_trader_positions(
+                session, self.trader.gamma_url, [t['address'] for t in tracked]
+            )
         
+        pending = []
         for trader_info in tracked:
             address = trader_info['address']
             nickname = trader_info['nickname']
             
             logging.info(f"🔍 Checking {nickname}...")
             
-            current_positions = self.trader.get_live_trader_positions(address)
+            current_positions = all_positions[address]
             
             if not current_positions:
                 logging.info(f"   No positions found")
@@ -529,12 +781,26 @@ class CopyTradingBot:
             if new_positions:
                 logging.info(f"   📍 Found {len(new_positions)} new position(s)")
             
+            pending.append((trader_info, current_positions, new_positions))
+        
+        # One bulk lookup for every new market this scan; it also warms the
+        # market cache so execute_paper_trade prices without another request
+        markets = self.trader.get_live_markets_by_ids(
+            [pos.get('market') for _, _, new_positions in pending for pos in new_positions]
+        )
+        
+        results = []
+        
+        for trader_info, current_positions, new_positions in pending:
+            address = trader_info['address']
+            nickname = trader_info['nickname']
+            
             for pos in new_positions:
                 market_id = pos.get('market')
                 outcome = pos.get('outcome')
                 their_size = float(pos.get('size', 0))
                 
-                market = self.trader.get_live_market_details(market_id)
+                market = markets.get(market_id) or self.trader.get_live_market_details(market_id)
                 
                 if not market:
                     continue
@@ -557,22 +823,13 @@ class CopyTradingBot:
                     market_question=question,
                     outcome=outcome,
                     side='BUY',
-                    size=our_size
+                    size=our_size,
+                    copied_from_trader=address
                 )
                 
                 if result['success']:
                     logging.info(f"      ✅ Trade executed @ ${result['price']:.3f}")
                     logging.info(f"      💰 New balance: ${result['new_balance']:.2f}")
-                    
-                    conn = sqlite3.connect(self.trader.db_path)
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        UPDATE tracked_traders
-                        SET total_copied_trades = total_copied_trades + 1
-                        WHERE address = ?
-                    """, (address,))
-                    conn.commit()
-                    conn.close()
                 else:
                     logging.error(f"      ❌ Failed: {result.get('error')}")
                 
@@ -596,18 +853,35 @@ class Week1Runner:
             initial_balance=100000
         )
         self.bot = CopyTradingBot(self.paper_trader, copy_ratio=0.02)
-        self.running = True
+        self._stop = threading.Event()
+        self._running = False
+        # Hourly summaries re-price every open position; keep that off the scan loop
+        self._summary_executor = ThreadPoolExecutor(max_workers=1)
         self.scan_interval = 300  # 5 minutes
+        self.optimize_every = 12  # scans between PRAGMA optimize
         
         signal.signal(signal.SIGINT, self.shutdown)
         signal.signal(signal.SIGTERM, self.shutdown)
     
-    def shutdown(self, signum, frame):
-        """Graceful shutdown"""
-        logging.info("\n🛑 Shutting down...")
-        self.running = False
-        self.print_summary()
-        sys.exit(0)
+    def shutdown(self, signum=None, frame=None):
+        """Graceful shutdown
+        
+        Before the scan loop starts, print the summary and exit right away.
+        While it runs, wake the loop and let the current scan finish; a second
+        signal force-exits a scan that is stuck.
+        """
+        if not self._running:
+            logging.info("\n🛑 Shutting down...")
+            self.print_summary()
+            self.paper_trader.close()
+            sys.exit(0)
+        
+        if self._stop.is_set():
+            logging.warning("\n🛑 Forcing exit before the current scan finished")
+            sys.exit(1)
+        
+        logging.info("\n🛑 Shutting down after the current scan (signal again to force)...")
+        self._stop.set()
     
     def print_summary(self):
         """Print current portfolio summary"""
@@ -633,8 +907,17 @@ class Week1Runner:
         print(f"   Positions:  {summary['open_positions']} open")
         print(f"   Trades:     {summary['total_trades']} total")
     
+    def _log_summary_error(self, future):
+        """Log a failed background summary, which would otherwise be dropped"""
+        error = future.exception()
+        if error is not None:
+            logging.error(f"\n❌ Error printing summary: {error}",
+                          exc_info=(type(error), error, error.__traceback__))
+    
     def run_continuous(self):
         """Run continuously with periodic scans"""
+        self._running = True
+        
         logging.info("="*70)
         logging.info("WEEK 1 PAPER TRADING - STARTING")
         logging.info("="*70)
@@ -644,7 +927,7 @@ class Week1Runner:
         
         scan_count = 0
         
-        while self.running:
+        while not self._stop.is_set():
             scan_count += 1
             logging.info(f"\n{'='*70}")
             logging.info(f"🔍 Scan #{scan_count} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -659,14 +942,29 @@ class Week1Runner:
                     logging.info(f"\nℹ️  No new positions detected")
                 
                 if scan_count % 12 == 0:  # Every hour
-                    self.print_summary()
+                    future = self._summary_executor.submit(self.print_summary)
+                    future.add_done_callback(self._log_summary_error)
+                
+                if scan_count % self.optimize_every == 0:
+                    self.paper_trader.optimize_database()
                 
             except Exception as e:
                 logging.error(f"\n❌ Error during scan: {e}")
                 import traceback
                 traceback.print_exc()
             
-            time.sleep(self.scan_interval)
+            # Returns early as soon as shutdown() sets the event
+            self._stop.wait(self.scan_interval)
+        
+        try:
+            self._summary_executor.shutdown(wait=True)
+            self.print_summary()
+        except Exception as e:
+            logging.error(f"\n❌ Error printing final summary: {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            self.paper_trader.close()
 
 
 def setup_traders(paper_trader):
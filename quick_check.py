@@ -3,7 +3,8 @@
 from paper_trading import PolymarketPaperTrading
 
 trader = PolymarketPaperTrading(db_path="week1_paper.db")
-summary = trader.get_portfolio_summary()
+trader.update_positions_with_live_prices()
+summary = trader.get_portfolio_summary(refresh=False)
 
 print(f"\n💰 Portfolio Value: ${summary['portfolio_value']:,.2f}")
 print(f"📊 P&L: ${summary['total_pnl']:,.2f} ({summary['total_return_pct']:+.2f}%)")
@@ -11,7 +12,7 @@ print(f"📈 Trades: {summary['total_trades']}")
 print(f"🎯 Open Positions: {summary['open_positions']}")
 
 # See your best positions
-positions = trader.get_open_positions()
+positions = trader.get_open_positions(refresh=False)
 if positions:
     print("\n🏆 Top 3 Positions:")
     sorted_pos = sorted(positions, key=lambda x: x['unrealized_pnl'], reverse=True)